@@ -4,10 +4,11 @@ import time
 import itertools
 import sys
 import asyncio
-import collections
 import json
+import os
 from pathlib import Path
 import random
+import weakref
 import litellm
 
 
@@ -34,21 +35,32 @@ async def completion(model, messages, tools):
         return res.choices[0].message
 
 
+# v1/adapter.py keeps its own copy of ERASE_LINE, running_under_ci and spinner; keep them in step
+ERASE_LINE = "\r\x1b[2K"  # carriage return, then ANSI clear-line
+
+def running_under_ci():
+    """CI systems set CI=true (or 1); an explicit CI=false or CI=0 means we're not under CI."""
+    return os.environ.get("CI", "").strip().lower() in ("1", "true", "yes")
+
 async def spinner(awaitable):
     """Show a spinner while awaiting the completion of an async function"""
-    if not sys.stdout.isatty():
+    if not sys.stdout.isatty() or running_under_ci():
         return await awaitable
-    (t0, spinner, task) = (time.time(), itertools.cycle("🌑🌒🌓🌔🌕🌖🌗🌘"), asyncio.ensure_future(awaitable))
+    (t0, spinner, task) = (time.monotonic(), itertools.cycle("🌑🌒🌓🌔🌕🌖🌗🌘"), asyncio.ensure_future(awaitable))
+    (write, flush) = (sys.stdout.write, sys.stdout.flush)
     try:
         while True:
-            sys.stdout.write(f"\r{next(spinner)} {time.time() - t0:.1f}s")
-            sys.stdout.flush()
+            elapsed = time.monotonic() - t0
+            write(f"\r{next(spinner)} {elapsed:.1f}s")
+            flush()
+            # Tick quickly at first so it feels responsive, then back off during long calls
+            tick = 0.2 if elapsed < 2 else 0.5 if elapsed < 8 else 1.0
             try:
-                return await asyncio.wait_for(asyncio.shield(task), timeout=0.2)
+                return await asyncio.wait_for(asyncio.shield(task), timeout=tick)
             except asyncio.TimeoutError:
                 continue
     finally:
-        sys.stdout.write("\r" + " " * 30 + "\r")
+        write(ERASE_LINE)
 
 
 async def try_repeatedly(async_func):
@@ -78,8 +90,26 @@ def as_described(desc):
     return decorator
 
 
+_TOOL_CACHE = weakref.WeakKeyDictionary()  # function -> {(name, bound): tool description}, for callables that don't accept attributes
+
 def function_to_tool(func,name=None):
-    """Convert a function with a docstring to a litellm tool description."""
+    """Convert a function with a docstring to a litellm tool description.
+    The result is cached on the function as __tool_meta__, since World rebuilds its tool list
+    for every agent, so callers mustn't mutate it."""
+    # Bound methods are created afresh on each attribute access, so cache on the underlying function
+    target = getattr(func, '__func__', func)
+    key = (name, func is not target)  # a bound method's signature leaves out its first parameter
+    cache = getattr(target, '__tool_meta__', None)
+    if cache is None:
+        try:
+            target.__tool_meta__ = cache = {}
+        except (AttributeError, TypeError):
+            try:
+                cache = _TOOL_CACHE.setdefault(target, {})
+            except TypeError:
+                cache = {}  # unhashable or not weakly referenceable, so don't cache
+    tool = cache.get(key)
+    if tool is not None: return tool
     doc = inspect.getdoc(func)
     if not doc: raise ValueError(f"Function {func.__name__} has no docstring")
     lines = doc.split('\n')
@@ -104,7 +134,7 @@ def function_to_tool(func,name=None):
         properties[param_name] = _parse_type_string(type_str, desc)
         if param.default == inspect.Parameter.empty: required.append(param_name)
     
-    return {
+    tool = {
         "type": "function",
         "function": {
             "name": func.__name__ if name is None else name,
@@ -116,6 +146,8 @@ def function_to_tool(func,name=None):
             },
         },
     }
+    cache[key] = tool
+    return tool
 
 def _extract_section(doc, section_name):
     """Extract a section from docstring (e.g., 'Args', 'Returns')."""
@@ -134,27 +166,13 @@ def _extract_section(doc, section_name):
             break
     return '\n'.join(lines[start_idx:end_idx])
 
+# Matches "param_name (type): description", where the description runs on until the next such line
+_ARG_RE = re.compile(r'^[ \t]+(\w+)[ \t]*\(([^)\n]+)\):[ \t]*(.*(?:\n(?![ \t]+\w+[ \t]*\([^)\n]+\):).*)*)', re.MULTILINE)
+
 def _parse_args_section(args_text):
     """Parse Args section into dict of param_name -> (type, description)."""
-    result = {}
-    lines = args_text.split('\n')
-    current_param = None
-    current_type = None
-    current_desc = []
-    for line in lines:
-        # Match: "param_name (type): description"
-        match = re.match(r'^\s+(\w+)\s*\(([^)]+)\):\s*(.*)', line)
-        if match:
-            if current_param:
-                result[current_param] = (current_type, ' '.join(current_desc).strip())
-            current_param = match.group(1)
-            current_type = match.group(2).strip()
-            current_desc = [match.group(3)]
-        elif current_param and line.strip():
-            current_desc.append(line.strip())
-    if current_param:
-        result[current_param] = (current_type, ' '.join(current_desc).strip())
-    return result
+    return {m.group(1): (m.group(2).strip(), ' '.join(line.strip() for line in m.group(3).split('\n') if line.strip()))
+            for m in _ARG_RE.finditer(args_text)}
 
 
 
@@ -179,50 +197,63 @@ def _parse_type_string(type_str, description):
     if list_match:
         inner_type = list_match.group(1)
         schema["type"] = "array"
-        schema["items"] = {"type": _map_simple_type(inner_type)}
+        schema["items"] = {"type": _ITEM_TYPE_MAP.get(inner_type, "string")}
         return schema
     
-    # Map common type strings to JSON schema types
-    if 'int' in type_str:
-        schema["type"] = "integer"
-    elif 'float' in type_str or 'number' in type_str:
-        schema["type"] = "number"
-    elif 'bool' in type_str:
-        schema["type"] = "boolean"
-    elif 'str' in type_str or 'string' in type_str:
-        schema["type"] = "string"
-    elif 'list' in type_str or 'array' in type_str:
-        schema["type"] = "array"
+    # Map common type strings to JSON schema types. Usually the first word is a plain type name;
+    # failing that, we look for one anywhere in the string (e.g. "optional[int]")
+    json_type = _TYPE_MAP.get(type_str.split(None, 1)[0]) if type_str else None
+    if json_type is None:
+        if 'int' in type_str:
+            json_type = "integer"
+        elif 'float' in type_str or 'number' in type_str:
+            json_type = "number"
+        elif 'bool' in type_str:
+            json_type = "boolean"
+        elif 'str' in type_str or 'string' in type_str:
+            json_type = "string"
+        elif 'list' in type_str or 'array' in type_str:
+            json_type = "array"
+        elif 'dict' in type_str or 'object' in type_str:
+            json_type = "object"
+        else:
+            json_type = "string"
+    schema["type"] = json_type
+    if json_type == "array":
         schema["items"] = {"type": "string"}  # default to string
-    elif 'dict' in type_str or 'object' in type_str:
-        schema["type"] = "object"
-    else:
-        schema["type"] = "string"
     
     return schema
 
-def _map_simple_type(type_str):
-    """Map a simple type string to JSON schema type."""
-    type_str = type_str.lower().strip()
-    if type_str == 'int' or type_str == 'integer':
-        return 'integer'
-    elif type_str == 'float' or type_str == 'number':
-        return 'number'
-    elif type_str == 'bool' or type_str == 'boolean':
-        return 'boolean'
-    else:
-        return 'string'
+_TYPE_MAP = {
+    "int": "integer", "integer": "integer",
+    "float": "number", "number": "number",
+    "bool": "boolean", "boolean": "boolean",
+    "str": "string", "string": "string",
+    "list": "array", "array": "array",
+    "dict": "object", "object": "object",
+}
+# list[...] items are only ever scalars; anything else defaults to string
+_ITEM_TYPE_MAP = {k: v for k, v in _TYPE_MAP.items() if v not in ("array", "object")}
 
 
 # For offline debugging, here's a dummy LLM.
 # All it does is grab a random response from the logs
 
 DUMMY_CHAT_LOGS = '.chats/*.jsonl'
+DUMMY_CACHE = Path('.chats/_dummy_cache.json')
+
+class DummyMessage:
+    __slots__ = ('role', 'content', 'tool_calls')
+    def __init__(self, role, content, tool_calls):
+        (self.role, self.content, self.tool_calls) = (role, content, tool_calls)
 
-DummyMessage = collections.namedtuple('DummyMessage', ['role', 'content', 'tool_calls'])
-DummyFunctionCall = collections.namedtuple('DummyFunctionCall', ['name', 'arguments'])
+class DummyFunctionCall:
+    __slots__ = ('name', 'arguments')
+    def __init__(self, name, arguments):
+        (self.name, self.arguments) = (name, arguments)
 
 class DummyToolCall:
+    __slots__ = ('type', 'id', 'function')
     def __init__(self, tool_call_dict):
         self.type = tool_call_dict['type']
         self.id = tool_call_dict['id']
@@ -230,26 +261,52 @@ class DummyToolCall:
     def model_dump(self):
         return {'id':self.id, 'type':self.type, 'function':{'name':self.function.name, 'arguments':self.function.arguments}}
 
+def load_assistant_responses():
+    """Gather all assistant messages from the chat logs.
+    The result is saved as JSON to DUMMY_CACHE, so we only rescan the logs when one of them has changed."""
+    files = sorted(Path('.').glob(DUMMY_CHAT_LOGS))
+    signature = [[str(fn), fn.stat().st_mtime_ns] for fn in files]  # lists, not tuples, to compare equal after a JSON round trip
+    try:
+        with open(DUMMY_CACHE, 'r') as f:
+            cache = json.load(f)
+        if cache['signature'] == signature: return cache['assistant_responses']
+    except Exception:
+        pass  # a missing or malformed cache is just a cache miss
+    assistant_responses = []
+    for fn in files:
+        with open(fn, 'r') as f:
+            for txt in f:
+                # Cheap substring tests first, so we only json-parse the lines that might match
+                if '"transcript_entry"' not in txt or '"assistant"' not in txt: continue
+                x = json.loads(txt)
+                if x['event_type'] != 'transcript_entry': continue
+                if x['role'] != 'assistant': continue
+                assistant_responses.append({k:x[k] for k in ['role','content','tool_calls'] if k in x})
+    try:
+        with open(DUMMY_CACHE, 'w') as f:
+            json.dump({'signature': signature, 'assistant_responses': assistant_responses}, f)
+    except OSError:
+        pass  # the cache is only an optimization
+    return assistant_responses
+
 def dummy_completion(messages, tools, _cache={}):
+    # Return a random assistant message.
+    # If the proposed message includes tool_calls, make sure it's only calling tools that we actually have.
+    # So we build (once per set of tools) a pool of (content, tool_calls) with the tool_calls filtered to those tools,
+    # omitting any message whose tool_calls were all filtered out.
     if 'assistant_responses' not in _cache:
-        files = Path('.').glob(DUMMY_CHAT_LOGS)
-        assistant_responses = []
-        for fn in files:
-            with open(fn, 'r') as f:
-                for i,txt in enumerate(f.readlines()):
-                    if txt.strip() == '': continue
-                    x = json.loads(txt)
-                    if x['event_type'] != 'transcript_entry': continue
-                    if x['role'] != 'assistant': continue
-                    assistant_responses.append({k:x[k] for k in ['role','content','tool_calls'] if k in x})        
-        _cache['assistant_responses'] = assistant_responses
-    assistant_responses = _cache['assistant_responses']
-    while True:
-        # Return a random assistant message.
-        # If the proposed message includes tool_calls, make sure it's only calling tools that we actually have.
-        msg = random.choice(assistant_responses).copy()
-        if not msg.get('tool_calls',None): break
-        got_tools = set(t['function']['name'] for t in tools if 'function' in t) if tools else set()
-        msg['tool_calls'] = [DummyToolCall(t) for t in msg['tool_calls'] if t['function']['name'] in got_tools]
-        if msg['tool_calls']: break
-    return DummyMessage(role='assistant', content=msg.get('content', None), tool_calls=msg.get('tool_calls', None))
+        _cache['assistant_responses'] = [(msg.get('content', None), [DummyToolCall(t) for t in msg.get('tool_calls', None) or []])
+                                         for msg in load_assistant_responses()]
+        _cache['pools'] = {}
+    got_tools = frozenset(t['function']['name'] for t in tools if 'function' in t) if tools else frozenset()
+    pool = _cache['pools'].get(got_tools)
+    if pool is None:
+        pool = []
+        for (content, tool_calls) in _cache['assistant_responses']:
+            if not tool_calls:
+                pool.append((content, None))
+            elif (usable := [t for t in tool_calls if t.function.name in got_tools]):
+                pool.append((content, usable))
+        _cache['pools'][got_tools] = pool
+    (content, tool_calls) = random.choice(pool)
+    return DummyMessage(role='assistant', content=content, tool_calls=tool_calls)
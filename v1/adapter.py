@@ -1,7 +1,10 @@
 from __future__ import annotations
-from typing import Awaitable, TypeVar
+from typing import TYPE_CHECKING, Awaitable, Callable, Iterator, TypeVar
 import json
+import os
 import sys
+import functools
+import mmap
 import time
 import itertools
 import asyncio
@@ -17,8 +20,26 @@ from typedefs import AssistantMessage, AssistantTranscriptItem, SystemMessage, T
 ## STATIC TYPING FOR LITELLM ##################################
 ###############################################################
 
+if TYPE_CHECKING:
+    import litellm.types.utils  # pyright: ignore  # not even typesafe
+
+# litellm is an egregiously slow import, so we do it lazily, but only once: these are bound by _ensure_litellm
+_litellm: Any = None
+_ModelResponse: type[litellm.types.utils.ModelResponse] | None = None
+_Choices: type[litellm.types.utils.Choices] | None = None
+_Usage: type[litellm.types.utils.Usage] | None = None
+
+def _ensure_litellm() -> None:
+    global _litellm, _ModelResponse, _Choices, _Usage
+    if _litellm is None:
+        import litellm
+        import litellm.types.utils  # pyright: ignore  # not even typesafe
+        _litellm = litellm
+        _ModelResponse, _Choices, _Usage = litellm.types.utils.ModelResponse, litellm.types.utils.Choices, litellm.types.utils.Usage
+
+
 async def acompletion(model: str, tools: list[mcp.Tool], messages: list[SystemMessage | UserMessage | AssistantMessage]) -> AssistantMessage:
-    import litellm  # egregiously slow import, so we're doing it lazily
+    _ensure_litellm()
 
     # Prompt caching strategy.
     # Observation: our message list grows monotonically in a given transcript,
@@ -35,37 +56,61 @@ async def acompletion(model: str, tools: list[mcp.Tool], messages: list[SystemMe
     #    - message 0, likely the system message shared by every user of the same core-tools,
     #    - message 1, likely the initial user message that contains CLAUDE.md and is shared by all transcripts for this project
     #    - message N-1, the final user message, shared by the next iteration of this agent
-    openai_prompt_cache_key = str(hash(str(Path.cwd())))  # used by OpenAI
-    is_anthropic = model.startswith("anthropic/") or model.startswith("claude")
+    openai_prompt_cache_key, is_anthropic = prompt_cache_params(os.getcwd(), model)
 
-    response = await spinner(litellm.acompletion(  # type: ignore
+    last = len(messages) - 1
+    response = await spinner(_litellm.acompletion(
         model=model,
         tools=[openai_tool_desc(tool) for tool in tools],
-        messages=[openai_message(msg, is_anthropic and (i<=1 or i==len(messages)-1)) for i,msg in enumerate(messages)],
+        messages=[openai_message(msg, is_anthropic and (i<=1 or i==last)) for i,msg in enumerate(messages)],
         user=openai_prompt_cache_key,
     ))
     return assistant_message(response)
 
+@functools.lru_cache(maxsize=8)
+def prompt_cache_params(cwd: str, model: str) -> tuple[str, bool]:
+    """Returns (openai_prompt_cache_key, is_anthropic), for the prompt caching strategy described in acompletion."""
+    return str(hash(cwd)), model.startswith("anthropic/") or model.startswith("claude")
+
 T = TypeVar("T")
+# ERASE_LINE, running_under_ci and spinner mirror the top-level utils.py, which v1 can't import
+# because it runs as its own program with bare imports; a fix to one copy belongs in the other.
+ERASE_LINE = "\r\x1b[2K"  # carriage return, then ANSI clear-line
+
+def running_under_ci() -> bool:
+    """CI systems set CI=true (or 1); an explicit CI=false or CI=0 means we're not under CI."""
+    return os.environ.get("CI", "").strip().lower() in ("1", "true", "yes")
 
 async def spinner(awaitable: Awaitable[T]) -> T:
-    if not sys.stdout.isatty():
+    if not sys.stdout.isatty() or running_under_ci():
         return await awaitable
-    t0, spinner, task = time.time(), itertools.cycle("🌑🌒🌓🌔🌕🌖🌗🌘"), asyncio.ensure_future(awaitable)
+    t0, spinner, task = time.monotonic(), itertools.cycle("🌑🌒🌓🌔🌕🌖🌗🌘"), asyncio.ensure_future(awaitable)
+    write, flush = sys.stdout.write, sys.stdout.flush
     try:
         while True:
-            sys.stdout.write(f"\r{next(spinner)} {time.time() - t0:.1f}s")
-            sys.stdout.flush()
+            elapsed = time.monotonic() - t0
+            write(f"\r{next(spinner)} {elapsed:.1f}s")
+            flush()
+            # Tick quickly at first so it feels responsive, then back off during long calls
+            tick = 0.2 if elapsed < 2 else 0.5 if elapsed < 8 else 1.0
             try:
-                return await asyncio.wait_for(asyncio.shield(task), timeout=0.2)
+                return await asyncio.wait_for(asyncio.shield(task), timeout=tick)
             except asyncio.TimeoutError:
                 continue
     finally:
-        sys.stdout.write("\r" + " " * 30 + "\r")
+        write(ERASE_LINE)
 
 
+_tool_desc_cache: dict[int, tuple[mcp.Tool, dict[str, Any]]] = {}
+"""id(tool) -> (tool, description). The env's tools are fixed for the whole session, so we build
+each description once rather than on every request. We hold onto the tool itself so that its id
+can't be recycled for a different tool."""
+
 def openai_tool_desc(tool: mcp.Tool) -> dict[str, Any]:
-    return {
+    cached = _tool_desc_cache.get(id(tool))
+    if cached is not None and cached[0] is tool:
+        return cached[1]
+    desc = {
         "type": "function",
         "function": {
             "name": tool.name,
@@ -73,6 +118,8 @@ def openai_tool_desc(tool: mcp.Tool) -> dict[str, Any]:
             "parameters": tool.inputSchema
         }
     }
+    _tool_desc_cache[id(tool)] = (tool, desc)
+    return desc
 
 
 def openai_message(message: SystemMessage | UserMessage | AssistantMessage, add_cache_control: bool) -> dict[str, Any]:
@@ -89,20 +136,31 @@ def openai_message(message: SystemMessage | UserMessage | AssistantMessage, add_
             }
         }
 
+    # We classify content blocks in a single pass. (type() is cheaper than isinstance, and these classes aren't subclassed.)
     if isinstance(message, AssistantMessage):
-        tool_calls = [openai_tool_use(item) for item in message.content if isinstance(item, ToolUseMessageContent)]
-        content = [item.model_dump() for item in message.content if not isinstance(item, ToolUseMessageContent)]
+        tool_calls: list[dict[str, Any]] = []
+        content: list[dict[str, Any]] = []
+        for item in message.content:
+            if type(item) is ToolUseMessageContent:
+                tool_calls.append(openai_tool_use(item))
+            else:
+                content.append(item.model_dump())
         return {"role": message.role, **({"content": content} if len(content)>0 else {}), **({"tool_calls": tool_calls} if len(tool_calls)>0 else {}) }
         # OpenAI requires tool_calls key to be absent if there aren't any
     else:
         message_content = [TextMessageContent(text=message.content)] if isinstance(message.content, str) else message.content
-        tools = [item for item in message_content if isinstance(item, ToolResultMessageContent)]
-        texts = [item for item in message_content if isinstance(item, TextMessageContent)]
+        tools: list[ToolResultMessageContent] = []
+        texts: list[TextMessageContent] = []
+        for item in message_content:
+            if type(item) is ToolResultMessageContent:
+                tools.append(item)
+            elif type(item) is TextMessageContent:
+                texts.append(item)
         if len(tools) == 0:
             r, content = {"role": message.role}, [item.model_dump() for item in texts]
         elif len(tools) > 0 and len(texts) == 0:
-            content = [TextMessageContent(text=c) if isinstance(c,str) else c for tool in tools for c in tool.content]
-            content = [item.model_dump() for item in content]
+            blocks = [TextMessageContent(text=c) if isinstance(c,str) else c for tool in tools for c in tool.content]
+            content = [item.model_dump() for item in blocks]
             r, content = {"role": "tool", "tool_call_id": tools[0].tool_use_id, "type": "tool_use"}, content
         else:
             raise ValueError(f"LiteLLM cant express {len(tools)} tool results with {len(texts)} text messages")
@@ -112,10 +170,11 @@ def openai_message(message: SystemMessage | UserMessage | AssistantMessage, add_
 
 
 def assistant_message(response: Any) -> AssistantMessage:
-    import litellm.types.utils  # pyright: ignore  # egregiously slow import, and not even typesafe
-    if not isinstance(response, litellm.types.utils.ModelResponse):
+    _ensure_litellm()
+    assert _ModelResponse is not None and _Choices is not None and _Usage is not None
+    if not isinstance(response, _ModelResponse):
         raise TypeError(f"Expected litellm.types.utils.ModelResponse, got {type(response)}")
-    if not isinstance(response.choices[0], litellm.types.utils.Choices):
+    if not isinstance(response.choices[0], _Choices):
         raise TypeError(f"Expected litellm.types.utils.Choice, got {type(response.choices[0])}")
     usage = getattr(response, 'usage', None)
     message = response.choices[0].message
@@ -130,7 +189,7 @@ def assistant_message(response: Any) -> AssistantMessage:
         if 'thinking' in thinking and 'signature' in thinking:
             content.append(ThinkingMessageContent(type="thinking", thinking=thinking['thinking'], signature=thinking['signature']))
 
-    if isinstance(usage, litellm.types.utils.Usage):
+    if isinstance(usage, _Usage):
         cached = usage.prompt_tokens_details.cached_tokens if usage.prompt_tokens_details else None
         message = (f"{cached} cached input tokens, {usage.prompt_tokens - cached} further input tokens" if cached else f"{usage.prompt_tokens} input tokens") + f", {usage.completion_tokens} response tokens"
         usage = usage.model_dump()
@@ -152,6 +211,24 @@ def assistant_message(response: Any) -> AssistantMessage:
 ## TRANSCRIPT DISK FILE #######################################
 ###############################################################
 
+# Transcript files are read and written a lot, so we use orjson for them if it's available
+try:
+    import orjson
+
+    def dumps_bytes(obj: Any) -> bytes:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # orjson rejects what json accepts, e.g. ints over 64 bits or non-str keys in a tool's input
+            return json.dumps(obj).encode()
+
+    loads_bytes: Callable[[bytes], Any] = orjson.loads
+except ImportError:
+    def dumps_bytes(obj: Any) -> bytes:
+        return json.dumps(obj).encode()
+
+    loads_bytes: Callable[[bytes], Any] = json.loads
+
 
 def append_to_transcript_file(transcript_file: Path, item: UserTranscriptItem | AssistantTranscriptItem) -> None:
     claude_compat_fields = {
@@ -165,104 +242,158 @@ def append_to_transcript_file(transcript_file: Path, item: UserTranscriptItem |
         "version": "0.1",
         }
 
-    # The file only has one content_block per line, so this is a list of content_blocks we'll need to write
-    content_blocks: list[str | dict[str, Any]] = []
+    # The file only has one content_block per line, so this is a list of content_blocks we'll need to write,
+    # each tagged with whether it's a tool result
+    content_blocks: list[tuple[bool, str | dict[str, Any]]] = []
     if isinstance(item.message.content, str):
-        content_blocks.append(item.message.content)
+        content_blocks.append((False, item.message.content))
     else:
         for content_block in item.message.content:
             if isinstance(content_block, TextMessageContent):
-                content_blocks.append(content_block.text)
+                content_blocks.append((False, content_block.text))
             else:
-                content_blocks.append(content_block.model_dump())
+                content_blocks.append((isinstance(content_block, ToolResultMessageContent), content_block.model_dump()))
 
     # Now it's a bit messy how much we duplicate of the item per content_block...
-    with open(transcript_file, "a") as f:
-        if isinstance(item, UserTranscriptItem):
-            for content_block in content_blocks:
-                message = {**item.message.model_dump(), "content": content_block}
-                raw_item = {
-                    **item.model_dump(),
-                    **claude_compat_fields,
-                    "uuid": str(uuid.uuid4()),
-                    "message": message,
-                    "toolUseResult": content_block if getattr(content_block, 'type', None) == 'tool_result' else None,
-                }
-                f.write(json.dumps(raw_item) + "\n")
-        else:
-            for i, content_block in enumerate(content_blocks):
-                is_final = i == len(content_blocks) - 1
-                message = {
-                    **item.message.model_dump(),
-                    "content": content_block,
-                    "stop_reason": item.message.stop_reason if is_final else None,
-                    "stop_sequence": item.message.stop_sequence if is_final else None,
-                    "usage": item.message.usage if is_final else None,
-                }
-                raw_item = {
-                    **item.model_dump(),
-                    **claude_compat_fields,
-                    "uuid": str(uuid.uuid4()),
-                    "message": message,
-                }
-                f.write(json.dumps(raw_item) + "\n")
-
-
-def parse_transcript_file(transcript_file: Path) -> list[UserTranscriptItem | AssistantTranscriptItem]:
-    lines = transcript_file.read_text().splitlines()
+    # We serialize the item and its message just once, and only vary the per-line fields.
+    base_item = {**item.model_dump(), **claude_compat_fields}
+    base_message = item.message.model_dump()
+    lines: list[bytes] = []
+    if isinstance(item, UserTranscriptItem):
+        for is_tool_result, content_block in content_blocks:
+            raw_item = {
+                **base_item,
+                "uuid": str(uuid.uuid4()),
+                "message": {**base_message, "content": content_block},
+                "toolUseResult": content_block if is_tool_result else None,
+            }
+            lines.append(dumps_bytes(raw_item) + b"\n")
+    else:
+        # Only the final line carries the stop_reason, stop_sequence and usage
+        non_final_message = {**base_message, "stop_reason": None, "stop_sequence": None, "usage": None}
+        for i, (_, content_block) in enumerate(content_blocks):
+            is_final = i == len(content_blocks) - 1
+            raw_item = {
+                **base_item,
+                "uuid": str(uuid.uuid4()),
+                "message": {**(base_message if is_final else non_final_message), "content": content_block},
+            }
+            lines.append(dumps_bytes(raw_item) + b"\n")
+    with open(transcript_file, "ab") as f:
+        if f.tell() == 0:
+            trusted_transcript_files.add(transcript_file.resolve())
+        f.write(b"".join(lines))
+
+
+def parse_transcript_file(transcript_file: Path, validate: bool | None = None) -> list[UserTranscriptItem | AssistantTranscriptItem]:
+    """Loads a transcript file. By default its content blocks are validated unless
+    the file is in trusted_transcript_files; pass validate to override that."""
+    key = transcript_file.resolve()
+    if validate is None:
+        validate = key not in trusted_transcript_files
     result: list[UserTranscriptItem | AssistantTranscriptItem] = []
-    for line in lines:
-        data = json.loads(line)
-        if "message" in data and "content" in data["message"]:
-            data["message"]["content"] = parse_message_content(data["message"]["content"])
-        item_type = data.get("type")
-        if item_type == "assistant":
-            result.append(AssistantTranscriptItem(**data))
-        elif item_type == "user":
-            result.append(UserTranscriptItem(**data))
-        elif item_type == "system" or item_type == "summary":
-            pass
+    # The file on disk uses multiple messages of the same type in a row,
+    # but we load them as a single message with multiple content blocks.
+    for item_type, entries in itertools.groupby(transcript_entries(transcript_file, validate), key=lambda data: data["type"]):
+        if item_type == "user":
+            uitems = [UserTranscriptItem(**data) for data in entries]
+            uitem = uitems[-1]
+            if len(uitems) > 1:
+                ucontent: list[TextMessageContent | ToolResultMessageContent] = []
+                for i in uitems:
+                    ucontent.extend([TextMessageContent(type="text", text=i.message.content)] if isinstance(i.message.content, str) else i.message.content)
+                uitem.message.content = ucontent
+            uitem.toolUseResult = None  # only exists on disk; see the INVARIANT in mini_agent.py
+            result.append(uitem)
         else:
+            aitems = [AssistantTranscriptItem(**data) for data in entries]
+            aitem = aitems[-1]
+            if len(aitems) > 1:
+                acontent: list[TextMessageContent | ToolUseMessageContent | ThinkingMessageContent] = []
+                for i in aitems:
+                    acontent.extend(i.message.content)
+                aitem.message.content = acontent
+            result.append(aitem)
+    if validate:
+        trusted_transcript_files.add(key)
+    return result
+
+
+def transcript_entries(transcript_file: Path, validate: bool = True) -> Iterator[dict[str, Any]]:
+    """Streams the user and assistant entries from a transcript file, one per line,
+    with their message content already parsed. Other entry types are skipped."""
+    for line in transcript_lines(transcript_file):
+        if not line.strip():
+            continue
+        data = loads_bytes(line)
+        item_type = data.get("type")
+        if item_type == "system" or item_type == "summary":
+            continue
+        elif item_type != "assistant" and item_type != "user":
             raise ValueError(f"Unknown transcript item type '{item_type}'")
-        
-        # The file on disk uses multiple messages of the same type in a row,
-        # but we load them as a single message with multiple content blocks.
-        if len(result) >= 2 and isinstance(result[-1], UserTranscriptItem) and isinstance(result[-2], UserTranscriptItem):
-            item1 = result[-2]
-            item2 = result[-1]
-            ucontent1: list[TextMessageContent | ToolResultMessageContent] = [TextMessageContent(type="text", text=item1.message.content)] if isinstance(item1.message.content, str) else item1.message.content
-            ucontent2: list[TextMessageContent | ToolResultMessageContent] = [TextMessageContent(type="text", text=item2.message.content)] if isinstance(item2.message.content, str) else item2.message.content
-            item2.message.content = ucontent1 + ucontent2
-            item2.toolUseResult = None
-            del result[-2]
-        elif len(result) >= 2 and isinstance(result[-1], AssistantTranscriptItem) and isinstance(result[-2], AssistantTranscriptItem):
-            item1 = result[-2]
-            item2 = result[-1]
-            acontent1: list[TextMessageContent | ToolUseMessageContent | ThinkingMessageContent] = [TextMessageContent(type="text", text=item1.message.content)] if isinstance(item1.message.content, str) else item1.message.content
-            acontent2: list[TextMessageContent | ToolUseMessageContent | ThinkingMessageContent] = [TextMessageContent(type="text", text=item2.message.content)] if isinstance(item2.message.content, str) else item2.message.content
-            item2.message.content = acontent1 + acontent2
-            del result[-2]
+        if "message" in data and "content" in data["message"]:
+            # append_to_transcript_file writes one bare content block per line, either a dict
+            # or (for text) a string; an assistant message's content has to be a list of blocks
+            content = data["message"]["content"]
+            if isinstance(content, dict):
+                content = [content]
+            elif isinstance(content, str) and item_type == "assistant":
+                content = [{"type": "text", "text": content}]
+            data["message"]["content"] = parse_message_content(content, validate=validate)
+        yield data
 
-    return result
+
+MMAP_THRESHOLD: int = 8 * 1024 * 1024
+
+def transcript_lines(transcript_file: Path) -> Iterator[bytes]:
+    """Yields the raw lines of a transcript file. Files of MMAP_THRESHOLD or bigger are mmapped
+    and sliced, rather than being copied through a read buffer."""
+    with open(transcript_file, "rb") as f:
+        if os.fstat(f.fileno()).st_size < MMAP_THRESHOLD:
+            yield from f
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = 0
+            while (end := mm.find(b"\n", start)) != -1:
+                yield mm[start:end]
+                start = end + 1
+            if start < len(mm):
+                yield mm[start:]
 
 
-def parse_message_content(raw_content: str | list[dict[str,Any]]) -> str | list[TextMessageContent | ThinkingMessageContent | ToolUseMessageContent | ToolResultMessageContent]:
+trusted_transcript_files: set[Path] = set()
+"""Transcript files whose every line was either written by append_to_transcript_file in this
+process, or has already been validated by parse_transcript_file. We trust their content blocks
+to have the right shape and skip pydantic validation when loading them. Any other file,
+e.g. one passed to --resume or copied over from Claude Code, is validated."""
+
+CONTENT_BLOCK_TYPES: dict[str, Any] = {
+    "text": TextMessageContent,
+    "tool_result": ToolResultMessageContent,
+    "thinking": ThinkingMessageContent,
+    "tool_use": ToolUseMessageContent,
+}
+
+
+def parse_message_content(raw_content: str | list[dict[str,Any]], validate: bool = True) -> str | list[TextMessageContent | ThinkingMessageContent | ToolUseMessageContent | ToolResultMessageContent]:
     """Given content which was parsed from json, i.e. is either a string or a list of dicts,
-    this constructs strongly typed pydantic content blocks."""
+    this constructs strongly typed pydantic content blocks.
+    If validate=False, it trusts the dicts to be well-formed and skips pydantic validation."""
     if isinstance(raw_content, str):
         return raw_content
     
     result: list[TextMessageContent | ThinkingMessageContent | ToolUseMessageContent | ToolResultMessageContent] = []
     for content_block in raw_content:
         data_type = content_block.get("type")
-        if data_type == "text":
-            result.append(TextMessageContent(**content_block))
-        elif data_type == "tool_result":
-            result.append(ToolResultMessageContent(**content_block))
-        elif data_type == "thinking":
-            result.append(ThinkingMessageContent(**content_block))
-        elif data_type == "tool_use":
-            result.append(ToolUseMessageContent(**content_block))
+        cls = CONTENT_BLOCK_TYPES.get(data_type) if isinstance(data_type, str) else None
+        if cls is None:
+            raise ValueError(f"Unknown user content block type '{data_type}'")
+        elif validate:
+            result.append(cls(**content_block))
+        elif cls is ToolResultMessageContent and isinstance(content_block.get("content"), list):
+            # model_construct doesn't recurse, so we have to construct the nested text blocks ourselves
+            nested = [TextMessageContent.model_construct(**c) for c in content_block["content"]]
+            result.append(cls.model_construct(**{**content_block, "content": nested}))
         else:
-            raise ValueError(f"Unknown user content block type '{data_type}'")        
-    return result
\ No newline at end of file
+            result.append(cls.model_construct(**content_block))
+    return result
@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 import json
+import os
 import platform
 import asyncio
 import fnmatch
@@ -9,7 +10,9 @@ import re
 import itertools
 import glob
 import shutil
+import stat
 import subprocess
+import tempfile
 import difflib
 import requests
 from pathlib import Path
@@ -71,6 +74,35 @@ store their contents, we skip the system-reminders; and we also don't have
 system-reminders for file deletion.
 """
 
+file_text_cache: dict[Path, tuple[tuple[int, int, int, int], str]] = {}
+"""The text of (small) files that we've read or written, keyed by resolved path,
+along with the file's file_version at that time. Edit and MultiEdit reuse the text
+while the file still has that version, rather than re-reading and decoding it for
+every call. Read always reads afresh."""
+
+def file_version(st: os.stat_result) -> tuple[int, int, int, int]:
+    # st_ino and st_ctime_ns change when another file is renamed over this one,
+    # even if it has the same size and its mtime was preserved (as some editors do)
+    return (st.st_ino, st.st_ctime_ns, st.st_mtime_ns, st.st_size)
+
+def cache_file_text(file_path: Path, text: str, st: os.stat_result | None = None) -> None:
+    st = st or file_path.stat()
+    # read_text() translates '\r\n' and '\r' into '\n', so text containing '\r' (which can only have
+    # come from a write) wouldn't match what a fresh read of the file gives back
+    if st.st_size < MAX_FILE_BYTES and '\r' not in text:
+        file_text_cache[file_path] = (file_version(st), text)
+    else:
+        file_text_cache.pop(file_path, None)
+
+def read_text_cached(file_path: Path) -> str:
+    st = file_path.stat()  # before reading: if the file changes in between, we'll just re-read next time
+    cached = file_text_cache.get(file_path)
+    if cached is not None and cached[0] == file_version(st):
+        return cached[1]
+    text = file_path.read_text()
+    cache_file_text(file_path, text, st)
+    return text
+
 MAX_PROMPTS_UNTIL_TODO_REMINDER = 10
 prompts_since_last_todo_mention: int = 0
 """If we've gone ten prompts without either a TodoWrite tool invocation
@@ -137,11 +169,14 @@ def read_impl(input: dict[str, Any]) -> Tuple[bool, list[mcp.types.ContentBlock]
         return False, [mcp.types.TextContent(type="text", text=f"<tool_use_error>File does not exist.{did_you_mean}</tool_use_error>")]
 
     try:
-        lines = file_path.read_text().splitlines()
+        st = file_path.stat()
+        text = file_path.read_text()
     except Exception as e:
         return False, [mcp.types.TextContent(type="text", text=f"Error reading file: {str(e)}")]
 
-    file_size = file_path.stat().st_size
+    lines = text.splitlines()
+    cache_file_text(file_path, text, st)
+    file_size = st.st_size
     known_content_files[file_path] = lines if file_size < MAX_FILE_BYTES else None
     stale_content_files.discard(file_path)
 
@@ -178,8 +213,8 @@ class HaveReadFilesWatcher(watchdog.events.FileSystemEventHandler):
         observer.schedule(self, str(Path.cwd()), recursive=True)
         observer.start()
 
-    def on_modified(self, event: watchdog.events.FileModifiedEvent | watchdog.events.DirModifiedEvent) -> None:
-        if isinstance(event, watchdog.events.DirModifiedEvent):
+    def on_modified(self, event: watchdog.events.FileSystemEvent) -> None:
+        if event.is_directory:
             return
         if isinstance(event.dest_path, bytes) or isinstance(event.src_path, bytes):
             return
@@ -187,6 +222,9 @@ class HaveReadFilesWatcher(watchdog.events.FileSystemEventHandler):
         if path in known_content_files:
             stale_content_files.add(path)
 
+    def on_moved(self, event: watchdog.events.FileSystemEvent) -> None:
+        self.on_modified(event)  # a file renamed over one we've read, e.g. by MultiEdit's write_text_atomic
+
     @staticmethod
     def diff(old: list[str], new: list[str], n: int = 8) -> str:
         diff = list(difflib.unified_diff(old, new, fromfile="old", tofile="new", lineterm="", n=n))
@@ -257,6 +295,57 @@ write_desc = mcp.types.Tool(
     }
 )
 
+def replace_would_lose_metadata(file_path: Path, st: os.stat_result) -> bool:
+    """Renaming a new file over file_path would drop its other hardlinks, its owner and
+    group (if they aren't ours), and its extended attributes."""
+    if st.st_nlink > 1:
+        return True
+    if hasattr(os, "geteuid") and (st.st_uid != os.geteuid() or st.st_gid != os.getegid()):
+        return True
+    if hasattr(os, "listxattr"):
+        try:
+            # security.* attributes (e.g. SELinux labels) are assigned afresh to the new file
+            return any(not name.startswith("security.") for name in os.listxattr(file_path))
+        except OSError:
+            return False
+    return False
+
+def write_text_atomic(file_path: Path, text: str) -> None:
+    """Writes to a temporary file alongside file_path, then renames it over file_path,
+    so that an interrupted write can't leave the file half-written. We write in place
+    instead if the file is new, if it isn't a regular file (e.g. a FIFO or /dev/null),
+    if we may not write to it (so that the write fails, rather than the rename quietly
+    replacing a read-only file), if the rename would lose metadata, or if we can't
+    create the temporary file."""
+    try:
+        st = file_path.stat()
+    except FileNotFoundError:
+        file_path.write_text(text)
+        return
+    if not stat.S_ISREG(st.st_mode):
+        file_path.write_text(text)
+        return
+    if not os.access(file_path, os.W_OK) or replace_would_lose_metadata(file_path, st):
+        file_path.write_text(text)
+        return
+    try:
+        fd, tmp_name = tempfile.mkstemp(dir=file_path.parent, prefix=f".{file_path.name}.", suffix=".tmp")
+    except OSError:
+        file_path.write_text(text)  # e.g. a writable file in a read-only directory
+        return
+    tmp_path = Path(tmp_name)
+    try:
+        with open(fd, "w") as f:
+            f.write(text)
+        shutil.copymode(file_path, tmp_path)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+def write_error(e: OSError) -> list[mcp.types.ContentBlock]:
+    return [mcp.types.TextContent(type="text", text=f"<tool_use_error>Error writing file: {e}</tool_use_error>")]
+
 def write_impl(input: dict[str, Any]) -> Tuple[bool, list[mcp.types.ContentBlock]]:
     file_path = Path(input["file_path"]).resolve()  # despite the docs, we deliberately allow relative paths
     content: str = input["content"]
@@ -267,7 +356,11 @@ def write_impl(input: dict[str, Any]) -> Tuple[bool, list[mcp.types.ContentBlock
             Error: File has not been read yet.
             Read it first before writing to it."""))]
     
-    file_path.write_text(content)
+    try:
+        write_text_atomic(file_path, content)
+    except OSError as e:
+        return False, write_error(e)
+    cache_file_text(file_path, content)
     known_content_files[file_path] = content.splitlines()
     stale_content_files.discard(file_path)
 
@@ -336,16 +429,43 @@ def one_edit_check(file_path: Path, old_content: str, edit: OneEdit) -> str | No
     elif edit.old_string == edit.new_string:
         return f"No changes to make: old_string and new_string are exactly the same."
     elif count == 0:
-        return f"String to replace not found in file.\nString: {edit.old_string}\n"
+        return not_found_error(edit.old_string)
     elif count > 1 and not edit.replace_all:
-        return dedent(f"""\
-            Found {count} matches of the string to replace, but replace_all is false.
-            To replace all occurrences, set replace_all to true.
-            To replace only one occurrence, please provide more context to uniquely identify the instance.
-            String: {edit.old_string}
-            """)
+        return too_many_matches_error(count, edit.old_string)
     else:
         return None
+
+def not_found_error(old_string: str) -> str:
+    return f"String to replace not found in file.\nString: {old_string}\n"
+
+def too_many_matches_error(count: int, old_string: str) -> str:
+    # Dedent before substituting, since a multiline old_string would otherwise defeat the dedent
+    return dedent("""\
+        Found {count} matches of the string to replace, but replace_all is false.
+        To replace all occurrences, set replace_all to true.
+        To replace only one occurrence, please provide more context to uniquely identify the instance.
+        String: {old_string}
+        """).format(count=count, old_string=old_string)
+
+def substring_of_any(needles: list[str], haystacks: list[str]) -> bool:
+    """Is any needle a substring of any haystack? Rather than test every pair, we search the haystacks
+    joined with a NUL separator, i.e. one C-level scan per needle; only a needle that itself
+    contains NUL (and so might match across the separator) has to be tested against each haystack."""
+    joined = "\0".join(haystacks)
+    return any(needle in joined if "\0" not in needle else any(needle in haystack for haystack in haystacks) for needle in needles)
+
+def unused_chars(count: int, texts: list[str]) -> list[str] | None:
+    """Returns count distinct characters that occur in none of the texts, or None if there aren't that many.
+    We prefer control characters, which text files rarely contain, and which keep an ASCII string
+    one byte per character, so that str operations on it stay at their fastest."""
+    candidates = itertools.chain(range(0x01, 0x09), range(0x0E, 0x20), (0x7F, 0x00), range(0x80, 0xA0), range(0xE000, 0xF900), range(0xF0000, 0x110000))
+    chars: list[str] = []
+    for c in map(chr, candidates):
+        if not any(c in text for text in texts):
+            chars.append(c)
+            if len(chars) == count:
+                return chars
+    return None
     
 
 def edit_impl(input: dict[str, Any]) -> Tuple[bool, list[mcp.types.ContentBlock]]:
@@ -354,7 +474,7 @@ def edit_impl(input: dict[str, Any]) -> Tuple[bool, list[mcp.types.ContentBlock]
     new_string: str = input["new_string"]
     replace_all: bool = input.get("replace_all", False)
 
-    old_content = file_path.read_text() if file_path.exists() else ""
+    old_content = read_text_cached(file_path) if file_path.exists() else ""
     edit = OneEdit(old_string=old_string, new_string=new_string, replace_all=replace_all)
     error = one_edit_check(file_path, old_content, edit)
     if error == "WRITE":
@@ -364,13 +484,17 @@ def edit_impl(input: dict[str, Any]) -> Tuple[bool, list[mcp.types.ContentBlock]
 
     index = old_content.find(edit.old_string)
     new_content = old_content.replace(edit.old_string, edit.new_string)
-    file_path.write_text(new_content)
+    try:
+        write_text_atomic(file_path, new_content)
+    except OSError as e:
+        return False, write_error(e)
+    cache_file_text(file_path, new_content)
     known_content_files[file_path] = new_content.splitlines() if len(new_content) < MAX_FILE_BYTES else None
 
     if replace_all:
         text = f"The file {input["file_path"]} has been updated. All occurrences of '{old_string.strip('\n')}' were successfully replaced with '{new_string.strip('\n')}'.\n"
     else:
-        first_line = len(old_content[:index].split('\n')) # 1-based
+        first_line = old_content.count('\n', 0, index) + 1 # 1-based
         num_lines = len(new_string.split('\n'))
         snippet = format_lines(new_content.splitlines(), offset=first_line-4, limit=num_lines+8)  
         text = f"The file {input['file_path']} has been updated. Here's the result of running `cat -n` on a snippet of the edited file:\n{snippet}"
@@ -393,6 +517,7 @@ multiedit_desc = mcp.types.Tool(
         - Don't include line-numbers.
 
         The list of edits are applied in order. They are applied atomically: either all, or none.
+        Every old_string is matched against the original file content, not against the result of earlier edits.
         Overlapped edits are not allowed."""),        
     inputSchema={
         "type": "object",
@@ -431,17 +556,65 @@ multiedit_desc = mcp.types.Tool(
 )
 
 
+edits_adapter = pydantic.TypeAdapter(list[OneEdit])  # built once, since building the validator is the costly part
+
+def apply_edits(old_content: str, edits: list[OneEdit]) -> Tuple[str | None, str]:
+    """Checks the edits against old_content, and applies them if they're all valid.
+    Returns (error, "") if any are invalid, else (None, new_content)."""
+    substring_error = "Cannot edit file: old_string is a substring of a new_string from a previous edit."
+
+    if len(edits) == 1:
+        # The common case needs no markers: str.count and str.replace agree with the general path
+        edit = edits[0]
+        count = old_content.count(edit.old_string)
+        if count == 0:
+            return not_found_error(edit.old_string), ""
+        elif edit.old_string in edit.new_string:
+            return substring_error, ""
+        elif count > 1 and not edit.replace_all:
+            return too_many_matches_error(count, edit.old_string), ""
+        return None, old_content.replace(edit.old_string, edit.new_string)
+
+    # Each edit claims the occurrences of its old_string that don't overlap an earlier edit's claims, taking
+    # them leftmost-first. We find them by replacing each edit's claims with a marker character that's in
+    # neither the file nor any edit: no old_string can match across a marker, so str.count and str.replace
+    # on the marked content see exactly the unclaimed text, and all the per-occurrence work stays in C.
+    markers = unused_chars(len(edits), [old_content, *(edit.old_string for edit in edits), *(edit.new_string for edit in edits)])
+    if markers is None:
+        return "Cannot edit file: it uses too many distinct characters.", ""
+    marked = old_content
+    match_counts: list[int] = []  # for each edit, how many occurrences of its old_string it will replace
+    for edit, marker in zip(edits, markers):
+        if edit.old_string not in old_content:
+            return not_found_error(edit.old_string), ""
+        count = marked.count(edit.old_string)
+        if count == 0:
+            return "String to replace overlaps with an earlier edit.\nString: " + edit.old_string + "\n", ""
+        marked = marked.replace(edit.old_string, marker)
+        match_counts.append(count)
+    if substring_of_any(list(dict.fromkeys(edit.old_string for edit in edits)), list(dict.fromkeys(edit.new_string for edit in edits))):
+        return substring_error, ""
+    for edit, count in zip(edits, match_counts):
+        if count > 1 and not edit.replace_all:
+            return too_many_matches_error(count, edit.old_string), ""
+
+    # Only the claimed occurrences became markers, so a replace_all edit can't touch text that another edit formed
+    new_content = marked
+    for edit, marker in zip(edits, markers):
+        new_content = new_content.replace(marker, edit.new_string)
+    return None, new_content
+
+
 def multiedit_impl(input: dict[str, Any]) -> Tuple[bool, list[mcp.types.ContentBlock]]:
     file_path = Path(input["file_path"]).resolve()
     error: str | None = None
     try:
-        edits = [OneEdit(**edit) for edit in input["edits"]]
-    except:
+        edits = edits_adapter.validate_python(input["edits"])
+    except (KeyError, pydantic.ValidationError):
         error = "Error: edits must be a list of objects with old_string, new_string, and optional replace_all."
         edits = []
 
-    old_content = file_path.read_text() if file_path.exists() else ""
-
+    new_content = ""
     if error:
         pass
     elif len(edits) == 0:
@@ -455,30 +628,17 @@ def multiedit_impl(input: dict[str, Any]) -> Tuple[bool, list[mcp.types.ContentB
     elif file_path not in known_content_files or file_path in stale_content_files:
         error = "Error: file has not been read yet. Read it first before writing to it."
     else:
-        new_content = old_content
-        for edit in edits:
-            if error:
-                break
-            if edit.old_string not in old_content:
-                error = "String to replace not found in file.\nString: " + edit.old_string + "\n"
-            elif edit.old_string not in new_content:
-                error = "String to replace overlaps with an earlier edit.\nString: " + edit.old_string + "\n"
-            else:
-                new_content = new_content.replace(edit.old_string, "𒐕𒐣𒐕")
-                # This cuneiform is unlikely to appear in the file, hence detects overlapped edits
-    if not error and any(any(edit1.old_string in edit2.new_string for edit2 in edits) for edit1 in edits):
-        error = "Cannot edit file: old_string is a substring of a new_string from a previous edit."
-
-
-    new_content = old_content
-    for edit in edits:
-        error = error or one_edit_check(file_path, new_content, edit)
-        new_content = new_content.replace(edit.old_string, edit.new_string)
+        # We only read the file once the edits themselves have passed validation
+        error, new_content = apply_edits(read_text_cached(file_path), edits)
 
     if error:
         return False, [mcp.types.TextContent(type="text", text=error)]
     else:
-        file_path.write_text(new_content)
+        try:
+            write_text_atomic(file_path, new_content)
+        except OSError as e:
+            return False, write_error(e)
+        cache_file_text(file_path, new_content)
         known_content_files[file_path] = new_content.splitlines() if len(new_content) < MAX_FILE_BYTES else None
 
         text = f"Applied {len(edits)} edit{'s' if len(edits) > 1 else ''} to {input['file_path']}:\n" + \
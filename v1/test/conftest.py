@@ -0,0 +1,7 @@
+from pathlib import Path
+import pytest
+
+@pytest.fixture(scope="session")
+def waltzing_bytes() -> bytes:
+    """The sample file that the Edit and MultiEdit tests start from, read once per session."""
+    return (Path(__file__).parent.absolute() / "sample_data" / "waltzing.txt").read_bytes()
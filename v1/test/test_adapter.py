@@ -0,0 +1,45 @@
+from pathlib import Path
+import json
+import pydantic
+import pytest
+import adapter
+from typedefs import AssistantMessage, AssistantTranscriptItem, TextMessageContent, ToolUseMessageContent
+
+
+def write_foreign_transcript(path: Path, content: list[dict[str, object]]) -> None:
+    """Writes a transcript line as if by another program, e.g. Claude Code."""
+    line = {"type": "assistant", "message": {"role": "assistant", "id": "id1", "type": "message", "model": "test", "content": content}}
+    path.write_text(json.dumps(line) + "\n")
+
+
+class TestTranscriptFile:
+    def test_foreign_file_with_malformed_block_is_rejected(self, tmp_path: Path):
+        transcript_file = tmp_path / "foreign.jsonl"
+        write_foreign_transcript(transcript_file, [{"type": "tool_use", "id": "call1", "name": "Read"}])  # no input
+        with pytest.raises(pydantic.ValidationError):
+            adapter.parse_transcript_file(transcript_file)
+
+    def test_foreign_file_is_validated_even_after_we_append_to_it(self, tmp_path: Path):
+        transcript_file = tmp_path / "foreign.jsonl"
+        write_foreign_transcript(transcript_file, [{"type": "tool_use", "id": "call1", "name": "Read"}])
+        tool_use = ToolUseMessageContent(id="call2", name="Read", input={"file_path": "/x"})
+        adapter.append_to_transcript_file(transcript_file, AssistantTranscriptItem(message=AssistantMessage(id="id2", model="test", content=[tool_use])))
+        with pytest.raises(pydantic.ValidationError):
+            adapter.parse_transcript_file(transcript_file)
+
+    def test_own_file_round_trips(self, tmp_path: Path):
+        transcript_file = tmp_path / "own.jsonl"
+        tool_use = ToolUseMessageContent(id="call1", name="Read", input={"file_path": "/x"})
+        message = AssistantMessage(id="id1", model="test", content=[TextMessageContent(text="hi"), tool_use])
+        adapter.append_to_transcript_file(transcript_file, AssistantTranscriptItem(message=message))
+        assert transcript_file.resolve() in adapter.trusted_transcript_files
+        [item] = adapter.parse_transcript_file(transcript_file)
+        assert isinstance(item, AssistantTranscriptItem)
+        assert item.message.content == message.content
+
+    def test_tool_input_that_orjson_rejects(self, tmp_path: Path):
+        transcript_file = tmp_path / "own.jsonl"
+        tool_use = ToolUseMessageContent(id="call1", name="Read", input={"id": 2**64})
+        adapter.append_to_transcript_file(transcript_file, AssistantTranscriptItem(message=AssistantMessage(id="id1", model="test", content=[tool_use])))
+        line = json.loads(transcript_file.read_text())
+        assert line["message"]["content"]["input"] == {"id": 2**64}
@@ -1,8 +1,8 @@
-from typing import Any, cast, Generator
-import tempfile
+from typing import Any, cast
+import os
 import pytest
 from pathlib import Path
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock
 from mini_agent import agentic_loop, Env
 from typedefs import AssistantMessage, SystemMessage, UserMessage, TextMessageContent, UserTranscriptItem
 import pydantic
@@ -10,6 +10,14 @@ import mcp
 import mcp.types
 
 
+# Built once at import: constructing pydantic models is most of the setup cost of these tests.
+# The mock hands out the same objects every time, so tests mustn't mutate them.
+_TOOL1_RESULT = mcp.types.CallToolResult(content=[mcp.types.TextContent(type="text", text="Tool1.result")], isError=False)
+_RESOURCE_TEMPLATES_RESULT = mcp.types.ListResourceTemplatesResult(resourceTemplates=[
+        mcp.types.ResourceTemplate(name="Resource1", uriTemplate="resource://resource1/{input}"),
+    ])
+
+
 class MockMcp:
     tool1 = mcp.types.Tool(name="Tool1", description="Tool1.desc", inputSchema={})
     resource1 = "resource://resource1/{input}"
@@ -17,12 +25,10 @@ class MockMcp:
     async def call_tool(self, name: str, arguments: dict[str, Any]) -> mcp.types.CallToolResult:
         if name != MockMcp.tool1.name:
             raise ValueError("tool name")
-        return mcp.types.CallToolResult(content=[mcp.types.TextContent(type="text", text="Tool1.result")], isError=False)
+        return _TOOL1_RESULT
 
     async def list_resource_templates(self, cursor: str | None = None) -> mcp.types.ListResourceTemplatesResult:
-        return mcp.types.ListResourceTemplatesResult(resourceTemplates=[
-                mcp.types.ResourceTemplate(name="Resource1", uriTemplate=MockMcp.resource1),
-            ])
+        return _RESOURCE_TEMPLATES_RESULT
 
     async def read_resource(self, uri: pydantic.AnyUrl) -> mcp.types.ReadResourceResult:
         schema = uri.scheme
@@ -36,31 +42,40 @@ class MockMcp:
 
 
 
+@pytest.fixture(scope="session")
+def mock_mcp() -> mcp.ClientSession:
+    return cast(mcp.ClientSession, MockMcp())
+
+
+@pytest.fixture
+def env(mock_mcp: mcp.ClientSession) -> Env:
+    # The transcript is only ever appended to, and these tests don't look at it
+    return Env(
+        execute_tools=True,
+        interactive=False,
+        system_message=SystemMessage(content=[]),
+        resources=[(MockMcp.resource1, mock_mcp)],
+        tools=[(MockMcp.tool1, mock_mcp)],
+        models={"model": "test_model", "digest-model": "test_digest_model"},
+        model="model",
+        transcript=[UserTranscriptItem(message=UserMessage(role="user", content=[TextMessageContent(text="Hello")]))],
+        transcript_file=Path(os.devnull)
+    )
+
+
+_WORLD_RESPONSE = AssistantMessage(id="id1", content=[TextMessageContent(text="world")], model="test")
+
+
 @pytest.fixture
-def env() -> Generator[Env, None, None]:
-    mcp1 = cast(mcp.ClientSession, MockMcp())
-    with tempfile.NamedTemporaryFile(mode='w') as f:
-        yield Env(
-            execute_tools=True,
-            interactive=False,
-            system_message=SystemMessage(content=[]),
-            resources=[(MockMcp.resource1, mcp1)],
-            tools=[(MockMcp.tool1, mcp1)],
-            models={"model": "test_model", "digest-model": "test_digest_model"},
-            model="model",
-            transcript=[UserTranscriptItem(message=UserMessage(role="user", content=[TextMessageContent(text="Hello")]))],
-            transcript_file=Path(f.name)
-        )
+def acompletion(monkeypatch: pytest.MonkeyPatch) -> AsyncMock:
+    m = AsyncMock(return_value=_WORLD_RESPONSE)
+    monkeypatch.setattr("mini_agent.adapter.acompletion", m)
+    return m
 
 
 class TestAgent:
 
-    @pytest.mark.asyncio
-    @patch("mini_agent.adapter.acompletion")
-    async def test_basic(self, acompletion: MagicMock, env: Env) -> None:
-        acompletion.return_value = AssistantMessage(id="id1", content=[
-            TextMessageContent(text="world")], model="test")
+    async def test_basic(self, acompletion: AsyncMock, env: Env) -> None:
         r = await agentic_loop(env)
         assert r[0].text == "world"
         acompletion.assert_called_once()
-
@@ -1,32 +1,48 @@
-import os
-import tempfile
 from pathlib import Path
 from textwrap import dedent
+import os
 import pytest
 import mcp.types
 import core_tools
 
-from typing import Generator
-
 @pytest.fixture
-def test_root() -> Generator[Path, None, None]:
-    original_dir = Path.cwd()
-    with tempfile.TemporaryDirectory() as temp_dir_str:
-        temp_dir = Path(temp_dir_str).resolve()
-        os.chdir(temp_dir)
-        yield temp_dir
-        os.chdir(original_dir)
-
-@pytest.fixture
-def existing_file(test_root: Path) -> Path:
-    src = Path(__file__).parent / "sample_data" / "waltzing.txt"
-    file_path = test_root / "existing.txt"
-    file_path.write_text(src.read_text())
+def existing_file(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, waltzing_bytes: bytes) -> Path:
+    monkeypatch.chdir(tmp_path)
+    file_path = tmp_path / "existing.txt"
+    file_path.write_bytes(waltzing_bytes)
     return file_path
 
 @pytest.fixture
-def fresh_file(test_root: Path) -> Path:
-    return test_root / "fresh.txt"
+def fresh_file(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    monkeypatch.chdir(tmp_path)
+    return tmp_path / "fresh.txt"
+
+# Expected edit results, dedented once at import; {existing_file} is filled in per test
+_EXPECTED_JACARANDA = dedent("""\
+    The file {existing_file} has been updated. Here's the result of running `cat -n` on a snippet of the edited file:
+        3→swagman
+        4→camped by
+        5→the billabong
+        6→under the shade
+        7→of a jacaranda tree
+        8→
+        9→and
+       10→he sang
+       11→as he watched
+    """)
+
+_EXPECTED_MULTILINE = dedent("""\
+    The file {existing_file} has been updated. Here's the result of running `cat -n` on a snippet of the edited file:
+        1→once
+        2→a jolly
+        3→swagman
+        4→camped by
+        5→Glacier National Park
+        6→
+        7→and
+        8→he sang
+        9→as he watched
+    """)
 
 class TestEdit:
     def test_create_fail(self, existing_file: Path):
@@ -65,18 +81,7 @@ class TestEdit:
         success, r = core_tools.edit_impl({"file_path": str(existing_file), "old_string": "coolibah", "new_string": "jacaranda"})
         assert success
         assert isinstance(r[0], mcp.types.TextContent)
-        assert r[0].text == dedent(f"""\
-            The file {existing_file} has been updated. Here's the result of running `cat -n` on a snippet of the edited file:
-                3→swagman
-                4→camped by
-                5→the billabong
-                6→under the shade
-                7→of a jacaranda tree
-                8→
-                9→and
-               10→he sang
-               11→as he watched
-            """)
+        assert r[0].text == _EXPECTED_JACARANDA.format(existing_file=existing_file)
         content = existing_file.read_text()
         assert "of a jacaranda tree" in content
 
@@ -118,18 +123,27 @@ class TestEdit:
         success, r = core_tools.edit_impl({"file_path": str(existing_file), "old_string": "the billabong\nunder the shade\nof a coolibah tree", "new_string": "Glacier National Park"})
         assert success
         assert isinstance(r[0], mcp.types.TextContent)
-        assert r[0].text == dedent(f"""\
-            The file {existing_file} has been updated. Here's the result of running `cat -n` on a snippet of the edited file:
-                1→once
-                2→a jolly
-                3→swagman
-                4→camped by
-                5→Glacier National Park
-                6→
-                7→and
-                8→he sang
-                9→as he watched
-            """)
+        assert r[0].text == _EXPECTED_MULTILINE.format(existing_file=existing_file)
         content = existing_file.read_text()
         assert "Glacier National Park" in content
-        assert "the billabong" not in content
\ No newline at end of file
+        assert "the billabong" not in content
+
+    def test_edit_after_writing_crlf(self, existing_file: Path):
+        core_tools.read_impl({"file_path": str(existing_file)})
+        success, r = core_tools.write_impl({"file_path": str(existing_file), "content": "one\r\ntwo\r\n"})
+        assert success
+        success, r = core_tools.edit_impl({"file_path": str(existing_file), "old_string": "one\ntwo", "new_string": "three"})
+        assert success
+        assert existing_file.read_text() == "three\n"
+
+    def test_edit_after_same_size_file_renamed_over(self, existing_file: Path):
+        # e.g. an editor that saves via a temp file and keeps the original mtime
+        core_tools.read_impl({"file_path": str(existing_file)})
+        st = existing_file.stat()
+        replacement = existing_file.with_name("replacement.txt")
+        replacement.write_text(existing_file.read_text().replace("jolly", "merry"))
+        os.utime(replacement, ns=(st.st_atime_ns, st.st_mtime_ns))
+        os.replace(replacement, existing_file)
+        success, r = core_tools.edit_impl({"file_path": str(existing_file), "old_string": "merry", "new_string": "happy"})
+        assert success
+        assert "a happy\nswagman" in existing_file.read_text()
@@ -8,6 +8,9 @@ import pytest
 import mcp.types
 import core_tools
 
+# The session fixtures below chdir for the rest of the session, so keep this file's tests together on one xdist worker
+pytestmark = pytest.mark.xdist_group("grep")
+
 def sortlines(text: str) -> str:
     """In a multiline string, this sorts all adjoining groups of lines that start with a slash (/)."""
     acc: list[str | list[str]] = []
@@ -1,16 +1,18 @@
 from typing import Generator
 from pathlib import Path
 from textwrap import dedent
+import os
+import stat
 import tempfile
+import threading
 import pytest
 import mcp.types
 import core_tools
 
 @pytest.fixture
-def file1() -> Generator[Path, None, None]:
+def file1(waltzing_bytes: bytes) -> Generator[Path, None, None]:
     with tempfile.NamedTemporaryFile(mode='w') as f:
-        content = (Path(__file__).parent / "sample_data" / "waltzing.txt").read_text()
-        Path(f.name).write_text(content)
+        Path(f.name).write_bytes(waltzing_bytes)
         core_tools.read_impl({"file_path": f.name})
         yield Path(f.name)
 
@@ -183,6 +185,27 @@ class TestMultiEdit:
             String: happy
             """)
 
+    def test_replace_all_ignores_text_formed_by_earlier_edits(self, file1: Path):
+        # Deleting the newlines forms "aaaa", but only the "aa" that was in the original file is replaced
+        file1.write_text("a\na\naa")
+        core_tools.read_impl({"file_path": str(file1)})
+        success, r = core_tools.multiedit_impl({"file_path": str(file1), "edits": [
+            {"old_string": "\n", "new_string": "", "replace_all": True},
+            {"old_string": "aa", "new_string": "bxb", "replace_all": True}
+        ]})
+        assert success
+        assert file1.read_text() == "aabxb"
+
+    def test_edits_on_content_with_control_characters(self, file1: Path):
+        file1.write_text("a\x01b\x02a\x7fb")
+        core_tools.read_impl({"file_path": str(file1)})
+        success, r = core_tools.multiedit_impl({"file_path": str(file1), "edits": [
+            {"old_string": "a", "new_string": "c", "replace_all": True},
+            {"old_string": "\x02", "new_string": "\x01"}
+        ]})
+        assert success
+        assert file1.read_text() == "c\x01b\x01c\x7fb"
+
     def test_successful_sequential_edits_on_different_parts(self, file1: Path):
         success, r = core_tools.multiedit_impl({"file_path": str(file1), "edits": [
             {"old_string": "once", "new_string": "Once"},
@@ -329,3 +352,131 @@ class TestMultiEdit:
             To replace only one occurrence, please provide more context to uniquely identify the instance.
             String: swagman
             """)
+
+    def test_match_count_is_taken_against_the_original_content(self, file1: Path):
+        # The first edit joins "a" and "b" into a second "ab", but only the one "ab" in the original file counts
+        file1.write_text("a_b ab")
+        core_tools.read_impl({"file_path": str(file1)})
+        success, r = core_tools.multiedit_impl({"file_path": str(file1), "edits": [
+            {"old_string": "_", "new_string": ""},
+            {"old_string": "ab", "new_string": "Z"}
+        ]})
+        assert success
+        assert file1.read_text() == "ab Z"
+
+    def test_match_count_skips_occurrences_claimed_by_earlier_edits(self, file1: Path):
+        # "a" occurs twice in the original, but the first edit has already claimed one of them
+        file1.write_text("a b a")
+        core_tools.read_impl({"file_path": str(file1)})
+        success, r = core_tools.multiedit_impl({"file_path": str(file1), "edits": [
+            {"old_string": "a b", "new_string": "c"},
+            {"old_string": "a", "new_string": "d"}
+        ]})
+        assert success
+        assert file1.read_text() == "c d"
+
+    def test_match_count_skips_occurrences_partially_overlapping_earlier_edits(self, file1: Path):
+        # The first "bc" overlaps the "ab" that the first edit replaces, so it's neither counted nor replaced
+        file1.write_text("abc bc")
+        core_tools.read_impl({"file_path": str(file1)})
+        success, r = core_tools.multiedit_impl({"file_path": str(file1), "edits": [
+            {"old_string": "ab", "new_string": "X"},
+            {"old_string": "bc", "new_string": "Y"}
+        ]})
+        assert success
+        assert file1.read_text() == "Xc Y"
+
+    def test_duplicate_matches_of_multiline_old_string(self, file1: Path):
+        file1.write_text("one\ntwo\nthree\none\ntwo\n")
+        core_tools.read_impl({"file_path": str(file1)})
+        success, r = core_tools.multiedit_impl({"file_path": str(file1), "edits": [
+            {"old_string": "three", "new_string": "3"},
+            {"old_string": "one\ntwo", "new_string": "1\n2"}
+        ]})
+        assert not success
+        assert isinstance(r[0], mcp.types.TextContent)
+        assert r[0].text == "Found 2 matches of the string to replace, but replace_all is false.\nTo replace all occurrences, set replace_all to true.\nTo replace only one occurrence, please provide more context to uniquely identify the instance.\nString: one\ntwo\n"
+
+    def test_write_replaces_file_and_leaves_no_temp_file(self, file1: Path):
+        success, r = core_tools.multiedit_impl({"file_path": str(file1), "edits": [
+            {"old_string": "jolly", "new_string": "happy"}
+        ]})
+        assert success
+        assert "a happy\nswagman" in file1.read_text()
+        assert list(file1.parent.glob(f".{file1.name}.*.tmp")) == []
+
+    def test_write_failure_leaves_file_and_no_temp_file(self, file1: Path, monkeypatch: pytest.MonkeyPatch):
+        def fail_replace(src: str, dst: str) -> None:
+            raise OSError("disk full")
+        monkeypatch.setattr(core_tools.os, "replace", fail_replace)
+        success, r = core_tools.multiedit_impl({"file_path": str(file1), "edits": [
+            {"old_string": "jolly", "new_string": "happy"}
+        ]})
+        assert not success
+        assert isinstance(r[0], mcp.types.TextContent)
+        assert r[0].text == "<tool_use_error>Error writing file: disk full</tool_use_error>"
+        assert "a jolly\nswagman" in file1.read_text()
+        assert list(file1.parent.glob(f".{file1.name}.*.tmp")) == []
+
+    def test_write_in_place_when_temp_file_cannot_be_created(self, file1: Path, monkeypatch: pytest.MonkeyPatch):
+        # e.g. a writable file in a read-only directory
+        def fail_mkstemp(**kwargs: str) -> tuple[int, str]:
+            raise PermissionError("read-only directory")
+        monkeypatch.setattr(core_tools.tempfile, "mkstemp", fail_mkstemp)
+        success, r = core_tools.multiedit_impl({"file_path": str(file1), "edits": [
+            {"old_string": "jolly", "new_string": "happy"}
+        ]})
+        assert success
+        assert "a happy\nswagman" in file1.read_text()
+
+    def test_write_keeps_hardlinks(self, waltzing_bytes: bytes, tmp_path: Path):
+        # both names under tmp_path, so that they're on the same filesystem
+        file = tmp_path / "waltzing.txt"
+        file.write_bytes(waltzing_bytes)
+        link = tmp_path / "link.txt"
+        os.link(file, link)
+        core_tools.read_impl({"file_path": str(file)})
+        success, r = core_tools.multiedit_impl({"file_path": str(file), "edits": [
+            {"old_string": "jolly", "new_string": "happy"}
+        ]})
+        assert success
+        assert "a happy\nswagman" in link.read_text()
+
+    @pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="needs os.mkfifo")
+    def test_write_through_to_fifo(self, tmp_path: Path):
+        # a rename would swap the FIFO for a regular file
+        fifo = tmp_path / "fifo"
+        os.mkfifo(fifo)
+        received: list[str] = []
+        # a daemon, so that if nothing ever opens the FIFO for writing, the test fails rather than hangs
+        reader = threading.Thread(target=lambda: received.append(fifo.read_text()), daemon=True)
+        reader.start()
+        core_tools.write_text_atomic(fifo, "hello\n")
+        reader.join(timeout=5)
+        assert not reader.is_alive()
+        assert received == ["hello\n"]
+        assert stat.S_ISFIFO(fifo.stat().st_mode)
+        assert list(tmp_path.iterdir()) == [fifo]
+
+    @pytest.mark.skipif(os.geteuid() != 0, reason="only root can give a file an arbitrary group")
+    def test_write_keeps_group(self, file1: Path):
+        # e.g. a group-writable file shared with a group that isn't our own
+        group = os.getegid() + 1
+        os.chown(file1, -1, group)
+        success, r = core_tools.multiedit_impl({"file_path": str(file1), "edits": [
+            {"old_string": "jolly", "new_string": "happy"}
+        ]})
+        assert success
+        assert file1.stat().st_gid == group
+        assert "a happy\nswagman" in file1.read_text()
+
+    @pytest.mark.skipif(os.geteuid() == 0, reason="root can write to read-only files")
+    def test_read_only_file(self, file1: Path):
+        file1.chmod(0o444)
+        success, r = core_tools.multiedit_impl({"file_path": str(file1), "edits": [
+            {"old_string": "jolly", "new_string": "happy"}
+        ]})
+        assert not success
+        assert isinstance(r[0], mcp.types.TextContent)
+        assert r[0].text == f"<tool_use_error>Error writing file: [Errno 13] Permission denied: '{file1.resolve()}'</tool_use_error>"
+        assert "a jolly\nswagman" in file1.read_text()
@@ -1,8 +1,8 @@
-import os
 import tempfile
 import shutil
 from pathlib import Path
 from textwrap import dedent
+import pytest
 import mcp.types
 import core_tools
 
@@ -147,9 +147,10 @@ class TestReadSimple:
         assert "<system-reminder>" in text
     
 class TestReadEdge:
-    def setup_method(self):
+    @pytest.fixture(autouse=True)
+    def chdir_to_root(self, monkeypatch: pytest.MonkeyPatch) -> None:
         self.root = Path(__file__).parent.absolute() / "sample_data" / "read_root"
-        os.chdir(self.root)
+        monkeypatch.chdir(self.root)
     
     def test_ok(self):
         isOk, result = core_tools.read_impl({"file_path": str(self.root / "file1.txt")})
@@ -222,6 +223,18 @@ class TestWrite:
                 1→bar
             """)
 
+    def test_write_failure(self, monkeypatch: pytest.MonkeyPatch):
+        core_tools.read_impl({"file_path": str(self.existing)})
+        def fail_replace(src: str, dst: str) -> None:
+            raise OSError("disk full")
+        monkeypatch.setattr(core_tools.os, "replace", fail_replace)
+        success, result_content = core_tools.write_impl({"file_path": str(self.existing), "content": "foo"})
+        assert not success
+        assert isinstance(result_content[0], mcp.types.TextContent)
+        assert result_content[0].text == "<tool_use_error>Error writing file: disk full</tool_use_error>"
+        assert self.existing.read_text() == "This is file 1."
+        assert [p.name for p in self.root.iterdir()] == ["file1.txt"]
+
 class TestDiff:
     old = list("abcdefghijklmnopqrstuvwxyz")
 